@@ -16,27 +16,79 @@ Attributes:
 
 """
 
-from flask import Flask, jsonify, make_response, Response, request
+from flask import Flask, jsonify, Response, request
+from flask.json.provider import DefaultJSONProvider
 import os
 import hashlib
 import sqlite3
 import json
+import orjson
 from dotenv import load_dotenv
 
+# Load environment variables from .env file before the models read them
+load_dotenv()
+
 from models.user_model import create_account, login, update_password
 from models.weather_model import (
-    fetch_weather_data,
+    CACHE_TTL,
+    load_weather_data,
     get_current_conditions,
     get_week_average_temp,
     get_max_temp_day,
     get_min_temp_day,
-    get_highest_precip_day
+    get_highest_precip_day,
+    get_day_stats
 )
 
-# Load environment variables from .env file
-load_dotenv()
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes and decodes with orjson.
+
+    Installed as `app.json` so every `jsonify` call and `request.get_json`
+    use orjson instead of the stdlib json module. Output matches Flask's
+    default provider: keys are sorted unless `sort_keys` is turned off, and
+    dates go through `default` so they are still HTTP date strings.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        """Serialize data as JSON.
+
+        Only the `sort_keys` and `indent` arguments are honored; orjson
+        supports a single indent width, so any indent is rendered as two
+        spaces. Other stdlib `json.dumps` arguments are ignored.
+        """
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+
+def _cached_json(payload) -> Response:
+    """Build a cacheable JSON response for weather data.
+
+    The payload is serialized with orjson, skipping Flask's stdlib-based
+    encoder. The response carries a content-hash `ETag` and a `Cache-Control`
+    max-age matching the server-side weather cache, and becomes a bodyless
+    `304 Not Modified` when the request's `If-None-Match` matches the ETag.
+
+    Args:
+        payload: Any JSON-serializable object.
+
+    Returns:
+        Response: A JSON response containing the serialized payload, or a 304.
+    """
+    body = orjson.dumps(payload)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.blake2b(body, digest_size=16).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_TTL
+    return response.make_conditional(request)
 
 @app.route('/')
 def home():
@@ -59,8 +111,8 @@ def call_api(city):
         or a JSON error response.
     """
     try:
-        response_data = fetch_weather_data(city)
-        return jsonify(response_data)
+        response_data = load_weather_data(city)
+        return _cached_json(response_data)
     except ValueError as err:
         return jsonify({"error": str(err)}), 500
 
@@ -69,7 +121,7 @@ def current_conditions(city):
     """Get the current weather conditions for a given city."""
     try:
         current_conditions = get_current_conditions(city)
-        return jsonify(current_conditions)
+        return _cached_json(current_conditions)
     except ValueError as err:
         return jsonify({"error": str(err)}), 500
 
@@ -78,7 +130,7 @@ def week_average_temp(city):
     """Calculate the weekly average temperature for a given city."""
     try:
         average_temp = get_week_average_temp(city)
-        return jsonify({"week_average_temp": average_temp})
+        return _cached_json({"week_average_temp": average_temp})
     except ValueError as err:
         return jsonify({"error": str(err)}), 500
 
@@ -87,7 +139,7 @@ def max_temp_day(city):
     """Determine the day with the highest maximum temperature for a given city."""
     try:
         max_day = get_max_temp_day(city)
-        return jsonify(max_day)
+        return _cached_json(max_day)
     except ValueError as err:
         return jsonify({"error": str(err)}), 500
 
@@ -96,7 +148,7 @@ def min_temp_day(city):
     """Determine the day with the lowest minimum temperature for a given city."""
     try:
         min_day = get_min_temp_day(city)
-        return jsonify(min_day)
+        return _cached_json(min_day)
     except ValueError as err:
         return jsonify({"error": str(err)}), 500
 
@@ -105,10 +157,23 @@ def highest_precip_day(city):
     """Determine the day with the highest precipitation probability for a given city."""
     try:
         highest_precip_day = get_highest_precip_day(city)
-        return jsonify(highest_precip_day)
+        return _cached_json(highest_precip_day)
     except ValueError as err:
         return jsonify({"error": str(err)}), 500
 
+@app.route('/api/<city>/summary', methods=['GET'])
+def summary(city):
+    """Get the weekly average temperature and the max temperature, min temperature
+    and highest precipitation days for a given city in one response."""
+    try:
+        day_stats = get_day_stats(city)
+        return _cached_json(day_stats)
+    except ValueError as err:
+        return jsonify({"error": str(err)}), 500
+
+# Pre-serialized body for the health check, which probes hit many times a second
+_HEALTHY_BODY = b'{"status":"healthy"}'
+
 @app.route('/api/health', methods=['GET'])
 def healthcheck() -> Response:
     """
@@ -118,9 +183,7 @@ def healthcheck() -> Response:
         JSON response indicating the health status of the service.
     """
     app.logger.info('Health check')
-    response = make_response(jsonify({"status": "healthy"}), 200)
-    app.logger.debug(f"Health Check Response: {response.get_data(as_text=True)}") 
-    return response  
+    return Response(_HEALTHY_BODY, mimetype='application/json')
 
 @app.route('/api/create-account', methods=['POST'])
 def create_account_route() -> Response:
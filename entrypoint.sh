@@ -19,5 +19,5 @@ else
     echo "Skipping database creation."
 fi
 
-# Start the Python application
-exec python app.py
\ No newline at end of file
+# Start the Python application under gunicorn
+exec gunicorn -c gunicorn_conf.py app:app
\ No newline at end of file
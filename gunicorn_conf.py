@@ -0,0 +1,26 @@
+"""Gunicorn configuration for serving the weather API in production.
+
+The app spends most of its time waiting on the Visual Crossing API and
+SQLite, so it runs on gevent workers: each worker monkey-patches the
+standard library at startup and yields to other requests while a
+greenlet is blocked on I/O.
+
+Example:
+    $ gunicorn -c gunicorn_conf.py app:app
+
+Attributes:
+    bind (str): The address to listen on, port taken from `PORT` (default 5002).
+    worker_class (str): The gunicorn worker type.
+    workers (int): The number of worker processes, from `WEB_CONCURRENCY`
+        or 2 * CPUs + 1.
+    worker_connections (int): The maximum concurrent connections per worker.
+
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5002')}"
+worker_class = 'gevent'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_connections = 1000
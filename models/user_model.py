@@ -1,15 +1,73 @@
+from collections import Counter
+from contextlib import contextmanager
 from dataclasses import dataclass
 import logging
 import os
+import queue
 import sqlite3
-from typing import Any
+import threading
+import time
+from typing import Any, Iterable
 import hashlib
+import hmac
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+
+try:
+    import gevent
+    import gevent.monkey
+    import gevent.threadpool
+except ImportError:  # gevent is only needed under the gunicorn gevent workers
+    gevent = None
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Argon2id hasher used for all new password hashes. Raising these parameters
+# later is safe: existing hashes are upgraded on the user's next login.
+_ph = PasswordHasher(time_cost=3, memory_cost=64 * 1024, parallelism=2)
+
+# Hash checked against when a username does not exist, so that unknown users
+# take as long to reject as wrong passwords and cannot be told apart by timing
+_DUMMY_HASH = _ph.hash("dummy password")
+
+# Native threads that run Argon2 under gunicorn's gevent workers. The pool is
+# separate from the hub's default one, which also serves DNS lookups. Each
+# worker process has its own pool, so a host runs up to workers *
+# HASH_POOL_SIZE hashes of 64 MiB at once; the default of 1 keeps that at one
+# per worker. Workers import the app after monkey-patching, since
+# gunicorn_conf.py does not preload it.
+HASH_POOL_SIZE = int(os.getenv('HASH_POOL_SIZE', '1'))
+if gevent is not None and gevent.monkey.is_module_patched('threading'):
+    _hash_pool = gevent.threadpool.ThreadPool(HASH_POOL_SIZE)
+else:
+    _hash_pool = None
+
+# SQL used by the account functions. Each pooled connection compiles these once
+# and then serves them from its prepared statement cache.
+_SQL_INSERT_USER = "INSERT INTO users (username, password) VALUES (?, ?)"
+_SQL_SELECT_PASSWORD = "SELECT password FROM users WHERE username = ?"
+_SQL_SELECT_USERNAMES = "SELECT username FROM users WHERE username IN ({placeholders})"
+_SQL_REPLACE_PASSWORD = "UPDATE users SET password = ? WHERE username = ? AND password = ?"
+
+# Size of each connection's prepared statement cache
+STATEMENT_CACHE_SIZE = 256
+
+# Shared connection pool, created on first use by get_db_connection()
+_pool = None
+_pool_lock = threading.Lock()
+
+# How long (in seconds) a stored password hash may be served from memory.
+# Kept short so password changes made by other processes are picked up quickly.
+PASSWORD_CACHE_TTL = 30
 
-@dataclass
+# Stored password hashes per username: username -> (expires_at, stored_hash)
+_password_cache = {}
+_password_cache_lock = threading.RLock()
+
+
+@dataclass(slots=True)
 class User:
     """Represents a user in the system.
 
@@ -23,25 +81,222 @@ class User:
     password: str
 
 
-def get_db_connection():
-    """Create and return a connection to the SQLite database.
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Open a new SQLite connection configured for the application.
 
-    Uses the `DB_PATH` environment variable to determine the database location. 
-    The connection returned has its `row_factory` set to `sqlite3.Row` to allow 
-    accessing columns by name.
+    Args:
+        db_path (str): The path to the SQLite database file.
 
     Returns:
-        sqlite3.Connection: A connection to the SQLite database.
+        sqlite3.Connection: A connection in WAL mode whose `row_factory` is
+        `sqlite3.Row`.
     """
-    conn = sqlite3.connect(os.getenv('DB_PATH'))
+    conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
 
+class SQLiteConnectionPool:
+    """A fixed-size, thread-safe pool of open SQLite connections.
+
+    All connections are opened up front. Callers borrow one for the duration
+    of a transaction and return it afterwards, blocking while all connections
+    are in use. Unlike thread-local connections, the number of open
+    connections stays bounded under gevent, where every request runs in its
+    own greenlet.
+
+    Attributes:
+        db_path (str): The path to the SQLite database file.
+        size (int): The number of connections in the pool.
+    """
+
+    def __init__(self, db_path: str, size: int):
+        self.db_path = db_path
+        self.size = size
+        self._connections = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self._connections.put(_connect(db_path))
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection from the pool within a transaction.
+
+        The transaction is committed when the block exits normally and rolled
+        back if it raises. The connection is returned to the pool either way.
+
+        Yields:
+            sqlite3.Connection: A pooled connection to the SQLite database.
+        """
+        conn = self._connections.get()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._connections.put(conn)
+
+    def close(self) -> None:
+        """Close every connection currently in the pool."""
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def close_db_pool() -> None:
+    """Close the shared connection pool so the next use opens a new one.
+
+    This is mainly useful when `DB_PATH` changes, for example between tests.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextmanager
+def get_db_connection():
+    """Provide a pooled connection to the SQLite database within a transaction.
+
+    The shared pool is created on first use from the `DB_PATH` environment
+    variable, with `DB_POOL_SIZE` connections (default 5). Reusing open
+    connections keeps the connection setup and SQLite's prepared statement
+    cache out of the request path.
+
+    Yields:
+        sqlite3.Connection: A connection to the SQLite database.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SQLiteConnectionPool(os.getenv('DB_PATH'), int(os.getenv('DB_POOL_SIZE', '5')))
+    with _pool.connection() as conn:
+        yield conn
+
+
+def _offload(func, *args):
+    """Run slow hashing work without blocking the other requests on a worker.
+
+    Under gunicorn's gevent workers every request on a worker shares one OS
+    thread, so a tens-of-milliseconds Argon2 call would stall all of them.
+    There the call runs in the dedicated `_hash_pool` of native threads
+    instead, which only suspends the calling greenlet; Argon2 releases the
+    GIL while hashing. Without gevent's monkey-patching the call runs directly.
+
+    Args:
+        func: The function to call.
+        *args: Positional arguments for `func`.
+
+    Returns:
+        The return value of `func`.
+    """
+    if _hash_pool is not None:
+        return _hash_pool.apply(func, args)
+    return func(*args)
+
+
+def hash_password(password: str) -> str:
+    """Hash a plaintext password with Argon2id.
+
+    Args:
+        password (str): The plaintext password to hash.
+
+    Returns:
+        str: The PHC-encoded Argon2id hash, including its salt and parameters.
+    """
+    return _offload(_ph.hash, password)
+
+
+def verify_password(stored_hash: str, password: str) -> bool:
+    """Check a plaintext password against a stored password hash.
+
+    Accounts created before the switch to Argon2id store an unsalted SHA-256
+    hex digest, which is still accepted so existing users can log in. Both
+    kinds of hash are compared in constant time.
+
+    Args:
+        stored_hash (str): The hash stored in the database.
+        password (str): The plaintext password to check.
+
+    Returns:
+        bool: True if the password matches the stored hash, False otherwise.
+    """
+    if not stored_hash.startswith('$argon2'):
+        return hmac.compare_digest(stored_hash.encode(), hashlib.sha256(password.encode()).hexdigest().encode())
+    try:
+        return _offload(_ph.verify, stored_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def password_needs_rehash(stored_hash: str) -> bool:
+    """Check whether a stored password hash should be replaced.
+
+    Legacy SHA-256 digests and Argon2 hashes made with different parameters
+    than the current hasher both need rehashing.
+
+    Args:
+        stored_hash (str): The hash stored in the database.
+
+    Returns:
+        bool: True if the hash should be recomputed with the current hasher.
+    """
+    if not stored_hash.startswith('$argon2'):
+        return True
+    return _ph.check_needs_rehash(stored_hash)
+
+
+def _get_cached_password(username: str):
+    """Get a user's stored password hash from the in-memory cache.
+
+    Args:
+        username (str): The username of the account.
+
+    Returns:
+        str | None: The cached hash, or None if it is missing or expired.
+    """
+    with _password_cache_lock:
+        cached = _password_cache.get(username)
+        if cached is None:
+            return None
+        if cached[0] <= time.monotonic():
+            del _password_cache[username]
+            return None
+        return cached[1]
+
+
+def _cache_password(username: str, stored_hash: str) -> None:
+    """Remember a user's stored password hash for `PASSWORD_CACHE_TTL` seconds.
+
+    Args:
+        username (str): The username of the account.
+        stored_hash (str): The hash stored in the database.
+    """
+    with _password_cache_lock:
+        _password_cache[username] = (time.monotonic() + PASSWORD_CACHE_TTL, stored_hash)
+
+
+def clear_password_cache(username: str = None) -> None:
+    """Drop cached password hashes.
+
+    Args:
+        username (str, optional): The account to drop. Drops every entry if omitted.
+    """
+    with _password_cache_lock:
+        if username is None:
+            _password_cache.clear()
+        else:
+            _password_cache.pop(username, None)
+
+
 def create_account(username: str, password: str) -> None:
     """Create a new user account with the given username and password.
 
-    The password is hashed using SHA-256 before storing it in the database.
+    The password is hashed using Argon2id before storing it in the database.
 
     Args:
         username (str): The desired username for the new account.
@@ -51,14 +306,11 @@ def create_account(username: str, password: str) -> None:
         ValueError: If the username already exists.
         sqlite3.Error: If a database error occurs.
     """
-    hashed_password = hashlib.sha256(password.encode()).hexdigest()
+    hashed_password = hash_password(password)
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO users (username, password)
-                VALUES (?, ?)
-            """, (username, hashed_password))
+            cursor.execute(_SQL_INSERT_USER, (username, hashed_password))
             conn.commit()
             logger.info("Account successfully created for username: %s", username)
     except sqlite3.IntegrityError:
@@ -69,10 +321,64 @@ def create_account(username: str, password: str) -> None:
         raise e
 
 
+def create_accounts(accounts: Iterable[tuple[str, str]]) -> None:
+    """Create several user accounts in a single transaction.
+
+    Every password is hashed with Argon2id first, then all rows are inserted
+    with one `executemany` and committed together, so seeding N accounts costs
+    one commit instead of N. If any username is taken, no account is created.
+
+    Args:
+        accounts (Iterable[tuple[str, str]]): `(username, password)` pairs for
+            the new accounts.
+
+    Raises:
+        ValueError: If a username already exists or appears more than once.
+        sqlite3.Error: If a database error occurs.
+    """
+    accounts = list(accounts)
+    if not accounts:
+        return
+    usernames = [username for username, _ in accounts]
+    # Reject repeats before paying for any of the slow hashes
+    repeated = sorted(username for username, count in Counter(usernames).items() if count > 1)
+    if repeated:
+        raise ValueError(f"Usernames given more than once: {', '.join(repeated)}")
+    rows = [(username, hash_password(password)) for username, password in accounts]
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(_SQL_INSERT_USER, rows)
+            conn.commit()
+        logger.info("Accounts successfully created for %d usernames", len(rows))
+    except sqlite3.IntegrityError as e:
+        # The failed batch was rolled back, so look up which usernames are taken
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ", ".join("?" * len(usernames))
+            cursor.execute(_SQL_SELECT_USERNAMES.format(placeholders=placeholders), usernames)
+            taken = sorted(row['username'] for row in cursor.fetchall())
+        if not taken:
+            # Some other constraint failed, such as a NULL username
+            logger.error("Database error: %s", str(e))
+            raise e
+        logger.error("Usernames already exist: %s", taken)
+        raise ValueError(f"Usernames already exist: {', '.join(taken)}")
+    except sqlite3.Error as e:
+        logger.error("Database error: %s", str(e))
+        raise e
+
+
 def login(username: str, password: str) -> bool:
     """Attempt to log in a user with the provided credentials.
 
-    The provided password is hashed and compared against the stored hash.
+    The provided password is verified against the stored hash, which is
+    cached in memory for `PASSWORD_CACHE_TTL` seconds so repeat logins skip
+    the database. If the stored hash is a legacy SHA-256 digest or uses
+    outdated Argon2 parameters, it is transparently replaced with a fresh hash
+    after a successful login. Unknown usernames are checked against a dummy
+    hash, so they take as long to reject as a wrong password.
 
     Args:
         username (str): The username of the account.
@@ -84,18 +390,38 @@ def login(username: str, password: str) -> bool:
     Raises:
         sqlite3.Error: If a database error occurs.
     """
-    hashed_password = hashlib.sha256(password.encode()).hexdigest()
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT password FROM users WHERE username = ?", (username,))
-            row = cursor.fetchone()
-            if row and row['password'] == hashed_password:
-                logger.info("Login successful for username: %s", username)
-                return True
-            else:
-                logger.warning("Invalid username or password for username: %s", username)
-                return False
+        stored_hash = _get_cached_password(username)
+        if stored_hash is None:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(_SQL_SELECT_PASSWORD, (username,))
+                row = cursor.fetchone()
+            if row:
+                stored_hash = row['password']
+                _cache_password(username, stored_hash)
+
+        if not stored_hash:
+            verify_password(_DUMMY_HASH, password)  # Match the timing of a real check
+            logger.warning("Invalid username or password for username: %s", username)
+            return False
+
+        if verify_password(stored_hash, password):
+            if password_needs_rehash(stored_hash):
+                new_hash = hash_password(password)
+                with get_db_connection() as conn:
+                    cursor = conn.cursor()
+                    # Only replace the hash that was verified, in case the
+                    # password was changed in the meantime
+                    cursor.execute(_SQL_REPLACE_PASSWORD, (new_hash, username, stored_hash))
+                    conn.commit()
+                clear_password_cache(username)
+                logger.info("Password hash upgraded for username: %s", username)
+            logger.info("Login successful for username: %s", username)
+            return True
+        else:
+            logger.warning("Invalid username or password for username: %s", username)
+            return False
     except sqlite3.Error as e:
         logger.error("Database error: %s", str(e))
         raise e
@@ -104,6 +430,11 @@ def login(username: str, password: str) -> bool:
 def update_password(username: str, old_password: str, new_password: str) -> None:
     """Update the password for a given user if the old password is correct.
 
+    The old password is verified outside of any database transaction, so the
+    slow hash check does not hold a pooled connection. The update then only
+    replaces the exact hash that was verified, which rejects the change if the
+    password was updated concurrently.
+
     Args:
         username (str): The username of the account.
         old_password (str): The user's current plaintext password.
@@ -113,20 +444,33 @@ def update_password(username: str, old_password: str, new_password: str) -> None
         ValueError: If the provided old password is invalid or the username does not exist.
         sqlite3.Error: If a database error occurs.
     """
-    hashed_old_password = hashlib.sha256(old_password.encode()).hexdigest()
-    hashed_new_password = hashlib.sha256(new_password.encode()).hexdigest()
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT password FROM users WHERE username = ?", (username,))
+            cursor.execute(_SQL_SELECT_PASSWORD, (username,))
             row = cursor.fetchone()
-            if row and row['password'] == hashed_old_password:
-                cursor.execute("UPDATE users SET password = ? WHERE username = ?", (hashed_new_password, username))
-                conn.commit()
-                logger.info("Password updated successfully for username: %s", username)
-            else:
-                logger.warning("Invalid old password for username: %s", username)
-                raise ValueError("Invalid username or old password")
+        if not row:
+            verify_password(_DUMMY_HASH, old_password)  # Match the timing of a real check
+            logger.warning("Invalid old password for username: %s", username)
+            raise ValueError("Invalid username or old password")
+        if not verify_password(row['password'], old_password):
+            logger.warning("Invalid old password for username: %s", username)
+            raise ValueError("Invalid username or old password")
+
+        # Only pay for hashing the new password once the old one checks out
+        hashed_new_password = hash_password(new_password)
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            # Only replace the hash that was verified; if the password changed
+            # since it was read, no row matches and the update is rejected
+            cursor.execute(_SQL_REPLACE_PASSWORD, (hashed_new_password, username, row['password']))
+            conn.commit()
+            updated = cursor.rowcount == 1
+        clear_password_cache(username)
+        if not updated:
+            logger.warning("Password changed concurrently for username: %s", username)
+            raise ValueError("Invalid username or old password")
+        logger.info("Password updated successfully for username: %s", username)
     except sqlite3.Error as e:
         logger.error("Database error: %s", str(e))
         raise e
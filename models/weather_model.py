@@ -1,49 +1,246 @@
+import atexit
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+import gzip
 import os
+import threading
+import time
+from urllib.parse import quote
+import zlib
+import orjson
 import requests
-import json
-from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Load environment variables from .env file
-load_dotenv()
+# Visual Crossing timeline URL with the constant query string. The API key is
+# filled in by _url_for, so it is read from the environment at first use.
+_URL_TEMPLATE = (
+    "https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/{city}/next7days"
+    "?unitGroup=us&include=days%2Ccurrent%2Cevents&key={key}&contentType=json"
+)
 
-def fetch_weather_data(city: str) -> dict:
+# Shared HTTP session so connections to Visual Crossing are kept alive and
+# pooled across requests instead of paying a TCP+TLS handshake every call.
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_connections=50,
+    pool_maxsize=50,
+    # Transient upstream failures (connection errors and 5xx responses) are
+    # retried with exponential backoff before surfacing as a ValueError
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        raise_on_status=False
+    )
+))
+atexit.register(_session.close)
+
+# (connect, read) timeouts in seconds for upstream calls
+REQUEST_TIMEOUT = (3.05, 10)
+
+# Maximum number of cities loaded at once by fetch_weather_data_batch
+BATCH_MAX_WORKERS = 8
+
+# Directory holding the per-city cache files (the working directory by default)
+CACHE_DIR = os.getenv('WEATHER_CACHE_DIR', '')
+if CACHE_DIR:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+# How long (in seconds) cached weather data for a city is considered fresh
+CACHE_TTL = 600
+
+# How long (in seconds) an unused cache file is kept on disk. Files older than
+# CACHE_TTL are still useful for conditional requests, so they outlive it.
+CACHE_FILE_MAX_AGE = 24 * 60 * 60
+
+# Maximum number of cities kept in each in-memory cache. The city comes from
+# the request path, so without a cap any client could grow the caches forever.
+MEMORY_CACHE_SIZE = 1024
+
+# Parsed weather data per city, least recently used first: city -> (expires_at, data)
+_weather_cache = OrderedDict()
+
+# Day statistics per city, least recently used first:
+# city -> (data the stats were computed from, stats)
+_stats_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# When (on the monotonic clock) old cache files should next be pruned
+_next_prune = 0.0
+
+# Loads currently in progress per city, shared by concurrent callers
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def normalize_city(city: str) -> str:
     """
-    Fetch weather data for a given city from the Visual Crossing API.
+    Normalize a city name so lookups that differ only in case or surrounding
+    whitespace share the same cache entries.
+
+    Args:
+        city (str): The city name as given by the caller.
+
+    Returns:
+        str: The normalized city name.
+    """
+    return city.strip().lower()
+
+@lru_cache(maxsize=1024)
+def _url_for(city: str) -> str:
+    """
+    Build the Visual Crossing request URL for a city, URL-encoding the city.
+
+    Args:
+        city (str): The city name to request.
+
+    Returns:
+        str: The request URL.
+
+    Raises:
+        ValueError: If the `WEATHER_API_KEY` environment variable is not set.
+    """
+    key = os.getenv('WEATHER_API_KEY')
+    if not key:
+        # Not cached, so the URL is built once the key has been configured
+        raise ValueError("WEATHER_API_KEY is not set")
+    return _URL_TEMPLATE.format(city=quote(city, safe=''), key=quote(key, safe=''))
+
+def fetch_weather_data_conditional(city: str, validators: dict) -> tuple:
+    """
+    Fetch weather data for a city unless it is unchanged since a cached copy.
+
+    The cached copy's validators are sent as `If-None-Match` and
+    `If-Modified-Since` headers, so an unchanged forecast costs an empty
+    `304 Not Modified` response instead of a full download and parse.
 
     Args:
         city (str): The city name for which to fetch weather data.
+        validators (dict): The `ETag` and/or `Last-Modified` values saved with
+            the cached copy. Pass an empty dict to fetch unconditionally.
 
     Returns:
-        dict: A dictionary containing weather data for the specified city.
+        tuple: `(data, validators)`, where `data` is None if the API reported
+        the cached copy is still current, and `validators` are the values to
+        save with the data.
     """
-    weather_api_key = os.getenv('WEATHER_API_KEY')
-    api_url = f"https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/{city}/next7days?unitGroup=us&include=days%2Ccurrent%2Cevents&key={weather_api_key}&contentType=json"
+    headers = {}
+    if validators.get('ETag'):
+        headers['If-None-Match'] = validators['ETag']
+    if validators.get('Last-Modified'):
+        headers['If-Modified-Since'] = validators['Last-Modified']
+    api_url = _url_for(normalize_city(city))
     try:
-        response = requests.get(api_url)
+        response = _session.get(api_url, headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 304:
+            return None, validators
         response.raise_for_status()
-        return response.json()
+        new_validators = {
+            name: response.headers[name]
+            for name in ('ETag', 'Last-Modified')
+            if name in response.headers
+        }
+        return orjson.loads(response.content), new_validators
     except requests.exceptions.HTTPError as http_err:
         raise ValueError(f"HTTP error occurred: {http_err}")
     except Exception as err:
         raise ValueError(f"An error occurred: {err}")
 
-def write_data_to_json_file(data: dict, filename: str) -> None:
+def fetch_weather_data(city: str) -> dict:
     """
-    Write data to a JSON file.
+    Fetch weather data for a given city from the Visual Crossing API.
+
+    Args:
+        city (str): The city name for which to fetch weather data.
+
+    Returns:
+        dict: A dictionary containing weather data for the specified city.
+    """
+    data, _ = fetch_weather_data_conditional(city, {})
+    return data
+
+def write_data_to_json_file(data: dict, filename: str, pretty: bool = False) -> None:
+    """
+    Write data to a gzip-compressed JSON file.
+
+    Compression level 1 keeps the CPU cost low while still shrinking the
+    repetitive weather JSON several times over. The data is written to a
+    temporary file that then atomically replaces `filename`, so concurrent
+    readers never see a partially written file.
 
     Args:
         data (dict): The data to write to a file.
         filename (str): The name of the file where data will be written.
+        pretty (bool, optional): Indent the JSON for human readers. The cache
+            files are written compact by default.
 
     Returns:
         None
     """
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=4)
+    option = orjson.OPT_INDENT_2 if pretty else None
+    # Serialize before creating the temporary file, so data that cannot be
+    # encoded never leaves an empty file behind
+    content = gzip.compress(orjson.dumps(data, option=option), compresslevel=1)
+    tmp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_filename, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
 
-def load_weather_data(city: str) -> dict:
+def get_cache_filename(city: str) -> str:
+    """
+    Get the path of the file used to cache weather data for a city.
+
+    Args:
+        city (str): The city whose cache file name to build.
+
+    Returns:
+        str: The cache file path for the city, inside `CACHE_DIR`.
+    """
+    return os.path.join(CACHE_DIR, f"weather_data_{city}.json.gz")
+
+def get_validators_filename(city: str) -> str:
+    """
+    Get the path of the file holding the HTTP validators for a city's cache file.
+
+    Args:
+        city (str): The city whose validators file name to build.
+
+    Returns:
+        str: The validators file path for the city, inside `CACHE_DIR`.
     """
-    Load weather data from a file or fetch it from the API if the file does not exist.
+    return os.path.join(CACHE_DIR, f"weather_data_{city}.validators.json.gz")
+
+def _read_json_file(filename: str):
+    """
+    Read and parse a gzip-compressed JSON file.
+
+    Args:
+        filename (str): The name of the file to read.
+
+    Returns:
+        The parsed data, or None if the file is missing, empty, or invalid.
+    """
+    try:
+        with open(filename, 'rb') as f:
+            return orjson.loads(gzip.decompress(f.read())) or None
+    except (OSError, EOFError, zlib.error, orjson.JSONDecodeError):
+        return None
+
+def _load_from_file_or_api(city: str) -> dict:
+    """
+    Load weather data for a city from its cache file, or from the API if the
+    file is missing, stale, empty, or invalid.
+
+    A stale cache file is revalidated with a conditional request when the API
+    sent an `ETag` or `Last-Modified` for it; if the data is unchanged the file
+    is reused and marked fresh again.
 
     Args:
         city (str): The city for which to load weather data.
@@ -51,20 +248,194 @@ def load_weather_data(city: str) -> dict:
     Returns:
         dict: The weather data dictionary loaded from file or retrieved from API.
     """
-    filename = 'weather_data.json'
-    if os.path.exists(filename) and os.path.getsize(filename) > 0:
-        try:
-            with open(filename, 'r') as f:
-                data = json.load(f)
-                if data:  # Ensure data is not empty or None
-                    return data
-        except json.JSONDecodeError:
-            pass  # Fall back to API if JSON is invalid
-    # Fetch data from the API if the file is missing, empty, or invalid
-    data = fetch_weather_data(city)
+    filename = get_cache_filename(city)
+    validators_filename = get_validators_filename(city)
+    validators = {}
+    try:
+        # One stat call gives both the size and the age of the cache file
+        st = os.stat(filename)
+    except OSError:
+        st = None
+    if st is not None and st.st_size > 0:
+        if time.time() - st.st_mtime < CACHE_TTL:
+            data = _read_json_file(filename)
+            if data:
+                return data
+        else:
+            validators = _read_json_file(validators_filename) or {}
+
+    data, validators = fetch_weather_data_conditional(city, validators)
+    if data is None:
+        data = _read_json_file(filename)
+        if data:
+            os.utime(filename)  # Unchanged upstream, so the cached copy is fresh again
+            return data
+        # The cached copy vanished or broke since it was revalidated
+        data, validators = fetch_weather_data_conditional(city, {})
+
     write_data_to_json_file(data, filename)
+    if validators:
+        write_data_to_json_file(validators, validators_filename)
+    else:
+        try:
+            os.remove(validators_filename)  # Don't revalidate new data with old validators
+        except FileNotFoundError:
+            pass
+    _maybe_prune_cache_files()
     return data
 
+def _cache_get(cache: OrderedDict, city: str):
+    """
+    Look up a city in a bounded in-memory cache, marking it recently used.
+
+    Args:
+        cache (OrderedDict): `_weather_cache` or `_stats_cache`.
+        city (str): The normalized city name.
+
+    Returns:
+        The cached entry, or None if the city is not cached.
+    """
+    with _cache_lock:
+        entry = cache.get(city)
+        if entry is not None:
+            cache.move_to_end(city)
+        return entry
+
+def _cache_put(cache: OrderedDict, city: str, entry) -> None:
+    """
+    Store an entry in a bounded in-memory cache, evicting the least recently
+    used cities beyond `MEMORY_CACHE_SIZE`.
+
+    Args:
+        cache (OrderedDict): `_weather_cache` or `_stats_cache`.
+        city (str): The normalized city name.
+        entry: The value to store for the city.
+
+    Returns:
+        None
+    """
+    with _cache_lock:
+        cache[city] = entry
+        cache.move_to_end(city)
+        while len(cache) > MEMORY_CACHE_SIZE:
+            cache.popitem(last=False)
+
+def prune_cache_files(max_age: float = CACHE_FILE_MAX_AGE) -> None:
+    """
+    Delete cache and validators files in `CACHE_DIR` that have not been
+    written or revalidated for `max_age` seconds.
+
+    Args:
+        max_age (float, optional): The age in seconds past which files are deleted.
+
+    Returns:
+        None
+    """
+    cutoff = time.time() - max_age
+    with os.scandir(CACHE_DIR or '.') as entries:
+        for entry in entries:
+            if not (entry.name.startswith('weather_data_') and entry.name.endswith('.json.gz')):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass  # Already removed by another worker
+
+def _maybe_prune_cache_files() -> None:
+    """
+    Run `prune_cache_files` at most once every `CACHE_TTL` seconds per process.
+
+    Returns:
+        None
+    """
+    global _next_prune
+    with _cache_lock:
+        if time.monotonic() < _next_prune:
+            return
+        _next_prune = time.monotonic() + CACHE_TTL
+    prune_cache_files()
+
+def clear_weather_cache() -> None:
+    """
+    Drop all weather data and day statistics cached in memory.
+
+    Cache files on disk are left alone; they expire on their own after
+    `CACHE_TTL` seconds and are deleted by `prune_cache_files`.
+
+    Returns:
+        None
+    """
+    with _cache_lock:
+        _weather_cache.clear()
+        _stats_cache.clear()
+
+def load_weather_data(city: str) -> dict:
+    """
+    Load weather data for a city from the in-memory cache, its cache file, or the API.
+
+    Parsed data is kept in memory for `CACHE_TTL` seconds so repeated lookups
+    skip the disk read and JSON parse; at most `MEMORY_CACHE_SIZE` cities are
+    kept, evicting the least recently used. Each city has its own cache file, which
+    is only used while it is younger than `CACHE_TTL`. City names are
+    normalized first, so "Boston" and " boston " share one entry. Concurrent
+    callers that miss the cache for the same city share a single load instead
+    of each calling the API.
+
+    Args:
+        city (str): The city for which to load weather data.
+
+    Returns:
+        dict: The weather data dictionary loaded from cache or retrieved from API.
+    """
+    city = normalize_city(city)
+    cached = _cache_get(_weather_cache, city)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    with _inflight_lock:
+        future = _inflight.get(city)
+        is_leader = future is None
+        if is_leader:
+            future = _inflight[city] = Future()
+    if not is_leader:
+        # Another caller is already loading this city; wait for its result
+        return future.result()
+
+    try:
+        data = _load_from_file_or_api(city)
+        _cache_put(_weather_cache, city, (time.monotonic() + CACHE_TTL, data))
+        future.set_result(data)
+        return data
+    except BaseException as err:
+        # Also covers gevent.Timeout, GreenletExit and KeyboardInterrupt, so
+        # waiting callers are never left blocked on an unresolved future
+        future.set_exception(err)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[city]
+
+def fetch_weather_data_batch(cities: list) -> dict:
+    """
+    Load weather data for several cities concurrently.
+
+    Each city goes through `load_weather_data`, so cached cities are served
+    from memory or their cache file and the rest fill the caches. Up to
+    `BATCH_MAX_WORKERS` loads run at once, so the API round trips overlap
+    instead of running one after another.
+
+    Args:
+        cities (list): The city names for which to load weather data.
+
+    Returns:
+        dict: A dictionary mapping each city name to its weather data.
+
+    Raises:
+        ValueError: If loading any of the cities fails.
+    """
+    with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as executor:
+        return dict(zip(cities, executor.map(load_weather_data, cities)))
 
 def get_current_conditions(city: str) -> dict:
     """
@@ -79,23 +450,85 @@ def get_current_conditions(city: str) -> dict:
     data = load_weather_data(city)
     return data.get('currentConditions', {})
 
-def get_week_average_temp(city: str) -> float:
+def compute_day_stats(days: list) -> dict:
     """
-    Calculate the weekly average temperature for a given city.
+    Compute the weekly average temperature and the max temperature, min temperature
+    and highest precipitation days in a single pass over the days.
+
+    Ties are resolved in favor of the earliest day.
 
     Args:
-        city (str): The city name for which to calculate the weekly average temperature.
+        days (list): The non-empty list of day dictionaries from the weather data.
 
     Returns:
-        float: The weekly average temperature.
+        dict: A dictionary with the keys `week_average_temp`, `max_temp_day`,
+        `min_temp_day` and `highest_precip_day`.
+    """
+    max_day = min_day = precip_day = days[0]
+    highest_max = max_day.get('tempmax', float('-inf'))
+    lowest_min = min_day.get('tempmin', float('inf'))
+    highest_precip = precip_day.get('precipprob', 0)
+    total_temp = 0
+    for day in days:
+        total_temp += day.get('temp', 0)
+        tempmax = day.get('tempmax', float('-inf'))
+        if tempmax > highest_max:
+            highest_max, max_day = tempmax, day
+        tempmin = day.get('tempmin', float('inf'))
+        if tempmin < lowest_min:
+            lowest_min, min_day = tempmin, day
+        precipprob = day.get('precipprob', 0)
+        if precipprob > highest_precip:
+            highest_precip, precip_day = precipprob, day
+
+    return {
+        'week_average_temp': total_temp / len(days),
+        'max_temp_day': max_day,
+        'min_temp_day': min_day,
+        'highest_precip_day': precip_day
+    }
+
+def get_day_stats(city: str) -> dict:
+    """
+    Get the day statistics for a given city.
+
+    The statistics are computed once per loaded weather document and reused
+    until the city's weather data is reloaded.
+
+    Args:
+        city (str): The city name for which to compute the statistics.
+
+    Returns:
+        dict: The statistics returned by `compute_day_stats`.
+
+    Raises:
+        ValueError: If the weather data has no day data.
     """
+    city = normalize_city(city)
     data = load_weather_data(city)
+    cached = _cache_get(_stats_cache, city)
+    if cached is not None and cached[0] is data:
+        return cached[1]
+
     days = data.get('days', [])
     if not days:
         raise ValueError("No day data available")
 
-    total_temp = sum(day.get('temp', 0) for day in days)
-    return total_temp / len(days)
+    stats = compute_day_stats(days)
+    _cache_put(_stats_cache, city, (data, stats))
+    return stats
+
+def get_week_average_temp(city: str) -> float:
+    """
+    Calculate the weekly average temperature for a given city.
+
+    Args:
+        city (str): The city name for which to calculate the weekly average temperature.
+
+    Returns:
+        float: The weekly average temperature.
+    """
+    return get_day_stats(city)['week_average_temp']
 
 def get_max_temp_day(city: str) -> dict:
     """
@@ -107,12 +540,7 @@ def get_max_temp_day(city: str) -> dict:
     Returns:
         dict: A dictionary representing the day with the highest max temperature.
     """
-    data = load_weather_data(city)
-    days = data.get('days', [])
-    if not days:
-        raise ValueError("No day data available")
-
-    return max(days, key=lambda d: d.get('tempmax', float('-inf')))
+    return get_day_stats(city)['max_temp_day']
 
 def get_min_temp_day(city: str) -> dict:
     """
@@ -124,12 +552,7 @@ def get_min_temp_day(city: str) -> dict:
     Returns:
         dict: A dictionary representing the day with the lowest min temperature.
     """
-    data = load_weather_data(city)
-    days = data.get('days', [])
-    if not days:
-        raise ValueError("No day data available")
-
-    return min(days, key=lambda d: d.get('tempmin', float('inf')))
+    return get_day_stats(city)['min_temp_day']
 
 def get_highest_precip_day(city: str) -> dict:
     """
@@ -141,9 +564,4 @@ def get_highest_precip_day(city: str) -> dict:
     Returns:
         dict: A dictionary representing the day with the highest precipitation probability.
     """
-    data = load_weather_data(city)
-    days = data.get('days', [])
-    if not days:
-        raise ValueError("No day data available")
-
-    return max(days, key=lambda d: d.get('precipprob', 0))
\ No newline at end of file
+    return get_day_stats(city)['highest_precip_day']
@@ -107,6 +107,17 @@ get_highest_precip_day() {
   }
 }
 
+get_summary() {
+  city=$1
+  echo "Fetching the weather summary for city ($city)..."
+  response=$(curl -s -X GET "$BASE_URL/$city/summary")
+  echo "Response: $response"
+  echo "$response" | grep -q '"week_average_temp"' || {
+    echo "Failed to fetch weather summary for $city."
+    exit 1
+  }
+}
+
 
 ##########################################################
 #
@@ -185,6 +196,7 @@ get_weekly_average "$CITY"
 get_max_temp_day "$CITY"
 get_min_temp_day "$CITY"
 get_highest_precip_day "$CITY"
+get_summary "$CITY"
 
 # User account tests
 create_account "testuser" "password123"
@@ -0,0 +1,40 @@
+from datetime import date, datetime
+
+import pytest
+
+from app import app
+
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+######################################################
+#
+#    JSON Provider
+#
+######################################################
+
+def test_json_dumps_sorts_keys():
+    """Test that keys are sorted like Flask's default JSON provider."""
+
+    assert app.json.dumps({"b": 1, "a": 2}) == '{"a":2,"b":1}'
+
+def test_json_dumps_dates_as_http_dates():
+    """Test that dates are formatted by Flask's default, not as ISO 8601."""
+
+    assert app.json.dumps({"d": datetime(2024, 1, 1)}) == '{"d":"Mon, 01 Jan 2024 00:00:00 GMT"}'
+    assert app.json.dumps({"d": date(2024, 1, 1)}) == '{"d":"Mon, 01 Jan 2024 00:00:00 GMT"}'
+
+def test_json_dumps_indent():
+    """Test that an indent request produces indented output."""
+
+    assert app.json.dumps({"a": 1}, indent=2) == '{\n  "a": 1\n}'
+
+def test_get_json_invalid_body(client):
+    """Test that a malformed JSON request body is rejected with a 400."""
+
+    response = client.post("/api/login", data="{not json", content_type="application/json")
+    assert response.status_code == 400
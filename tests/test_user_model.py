@@ -1,16 +1,45 @@
 from contextlib import contextmanager
-import re
+import os
 import sqlite3
 import hashlib
+import threading
+import time
 
+from argon2 import PasswordHasher
 import pytest
 
+import models.user_model
+
 from models.user_model import (
+    clear_password_cache,
+    close_db_pool,
+    get_db_connection,
     create_account,
+    create_accounts,
     login,
-    update_password
+    update_password,
+    PASSWORD_CACHE_TTL,
+    hash_password,
+    verify_password,
+    password_needs_rehash
 )
 
+ph = PasswordHasher()
+
+# Argon2id hashes of the passwords used below, computed once per test run
+# because each hash deliberately takes tens of milliseconds
+HASHES = {
+    password: hash_password(password)
+    for password in ("password123", "wrongpassword", "oldpassword", "wrongoldpassword")
+}
+
+# Unsalted SHA-256 digests as stored for accounts created before Argon2id
+LEGACY_PASSWORD123_HASH = hashlib.sha256(b"password123").hexdigest()
+LEGACY_WRONGPASSWORD_HASH = hashlib.sha256(b"wrongpassword").hexdigest()
+
+# Schema script for the users table
+USER_TABLE_SQL = os.path.join(os.path.dirname(__file__), "..", "sql", "create_user_table.sql")
+
 ######################################################
 #
 #    Fixtures
@@ -18,7 +47,14 @@ from models.user_model import (
 ######################################################
 
 def normalize_whitespace(sql_query: str) -> str:
-    return re.sub(r'\s+', ' ', sql_query).strip()
+    return " ".join(sql_query.split())
+
+@pytest.fixture(autouse=True)
+def clear_cached_passwords():
+    """Start every test with an empty password hash cache."""
+    clear_password_cache()
+    yield
+    clear_password_cache()
 
 @pytest.fixture
 def mock_cursor(mocker):
@@ -28,6 +64,7 @@ def mock_cursor(mocker):
     mock_conn.cursor.return_value = mock_cursor
     mock_cursor.fetchone.return_value = None  
     mock_cursor.fetchall.return_value = []
+    mock_cursor.rowcount = 1
     mock_conn.commit.return_value = None
 
     @contextmanager
@@ -38,6 +75,62 @@ def mock_cursor(mocker):
 
     return mock_cursor 
 
+######################################################
+#
+#    Database Connection
+#
+######################################################
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "users.db")
+    monkeypatch.setenv("DB_PATH", path)
+    monkeypatch.setenv("DB_POOL_SIZE", "2")
+    close_db_pool()
+    yield path
+    close_db_pool()
+
+def test_get_db_connection_reuses_pooled_connections(db_path):
+    """Test that connections are borrowed from and returned to a bounded pool."""
+
+    with get_db_connection() as first:
+        journal_mode = first.execute("PRAGMA journal_mode").fetchone()[0]
+        with get_db_connection() as second:
+            assert second is not first, "Expected concurrent borrowers to get different connections."
+    with get_db_connection() as conn:
+        assert conn in (first, second), "Expected a returned connection to be reused."
+
+    assert journal_mode == "wal", f"Expected WAL journal mode, got {journal_mode}."
+
+def test_get_db_connection_waits_when_pool_exhausted(db_path):
+    """Test that a borrower blocks until a connection is returned to the pool."""
+
+    acquired = threading.Event()
+    def worker():
+        with get_db_connection():
+            acquired.set()
+
+    with get_db_connection(), get_db_connection():
+        thread = threading.Thread(target=worker)
+        thread.start()
+        assert not acquired.wait(timeout=0.1), "Expected the third borrower to wait."
+    thread.join(timeout=5)
+    assert acquired.is_set(), "Expected the waiting borrower to get a connection."
+
+def test_get_db_connection_rolls_back_on_error(db_path):
+    """Test that a failed block does not commit its changes."""
+
+    with get_db_connection() as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+
+    with pytest.raises(RuntimeError):
+        with get_db_connection() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('x')")
+            raise RuntimeError("boom")
+
+    with get_db_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+
 ######################################################
 #
 #    Create Account
@@ -58,10 +151,11 @@ def test_create_account(mock_cursor):
 
     assert actual_query == expected_query, "The SQL query did not match the expected structure."
 
-    actual_arguments = mock_cursor.execute.call_args[0][1]
+    actual_username, actual_hash = mock_cursor.execute.call_args[0][1]
 
-    expected_arguments = ("testuser", hashlib.sha256("password123".encode()).hexdigest())
-    assert actual_arguments == expected_arguments, f"The SQL query arguments did not match. Expected {expected_arguments}, got {actual_arguments}."
+    assert actual_username == "testuser", f"Expected username 'testuser', got {actual_username}."
+    assert actual_hash.startswith("$argon2id$"), "Expected the password to be stored as an Argon2id hash."
+    assert ph.verify(actual_hash, "password123"), "The stored hash does not match the password."
 
 def test_create_account_duplicate(mock_cursor):
     """Test creating an account with a duplicate username, raising an IntegrityError."""
@@ -71,6 +165,49 @@ def test_create_account_duplicate(mock_cursor):
     with pytest.raises(ValueError, match="Username 'testuser' already exists"):
         create_account(username="testuser", password="password123")
 
+def test_create_accounts(mock_cursor):
+    """Test creating several accounts with one batched insert."""
+
+    create_accounts([("alice", "password123"), ("bob", "oldpassword")])
+
+    query, rows = mock_cursor.executemany.call_args[0]
+    assert normalize_whitespace(query) == "INSERT INTO users (username, password) VALUES (?, ?)"
+    assert [username for username, _ in rows] == ["alice", "bob"]
+    assert ph.verify(rows[0][1], "password123"), "The stored hash does not match the password."
+    assert ph.verify(rows[1][1], "oldpassword"), "The stored hash does not match the password."
+
+def test_create_accounts_repeated_username(mock_cursor, mocker):
+    """Test that a batch naming a username twice is rejected before any hashing or insert."""
+
+    mock_hash = mocker.patch("models.user_model.hash_password")
+
+    with pytest.raises(ValueError, match="Usernames given more than once: alice"):
+        create_accounts([("alice", "password123"), ("alice", "oldpassword")])
+    mock_hash.assert_not_called()
+    mock_cursor.executemany.assert_not_called()
+
+def test_create_accounts_other_integrity_error(db_path):
+    """Test that constraint failures other than taken usernames are re-raised as is."""
+
+    with open(USER_TABLE_SQL) as f, get_db_connection() as conn:
+        conn.executescript(f.read())
+
+    with pytest.raises(sqlite3.IntegrityError, match="NOT NULL"):
+        create_accounts([("alice", "password123"), (None, "oldpassword")])
+
+def test_create_accounts_existing_username(db_path):
+    """Test that a batch with a taken username creates no accounts and names the taken one."""
+
+    with open(USER_TABLE_SQL) as f, get_db_connection() as conn:
+        conn.executescript(f.read())
+    create_account("bob", "password123")
+
+    with pytest.raises(ValueError, match="Usernames already exist: bob"):
+        create_accounts([("alice", "password123"), ("bob", "oldpassword")])
+
+    with get_db_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+
 ######################################################
 #
 #    Login
@@ -80,19 +217,76 @@ def test_create_account_duplicate(mock_cursor):
 def test_login_success(mock_cursor):
     """Test successful login with correct username and password."""
 
-    mock_cursor.fetchone.return_value = {"password": hashlib.sha256("password123".encode()).hexdigest()}
+    mock_cursor.fetchone.return_value = {"password": HASHES["password123"]}
+
+    result = login(username="testuser", password="password123")
+    assert result is True, "Expected login to succeed, but it failed."
+    assert mock_cursor.execute.call_count == 1, "Expected no rehash for an up-to-date hash."
+
+def test_login_success_legacy_sha256(mock_cursor):
+    """Test successful login for an account stored with a legacy SHA-256 hash."""
+
+    mock_cursor.fetchone.return_value = {"password": LEGACY_PASSWORD123_HASH}
 
     result = login(username="testuser", password="password123")
     assert result is True, "Expected login to succeed, but it failed."
 
+    expected_query = normalize_whitespace("UPDATE users SET password = ? WHERE username = ? AND password = ?")
+    actual_query = normalize_whitespace(mock_cursor.execute.call_args_list[1][0][0])
+    assert actual_query == expected_query, "Expected the legacy hash to be upgraded."
+
+    new_hash, actual_username, old_hash = mock_cursor.execute.call_args_list[1][0][1]
+    assert actual_username == "testuser"
+    assert old_hash == LEGACY_PASSWORD123_HASH
+    assert ph.verify(new_hash, "password123"), "The upgraded hash does not match the password."
+
+def test_login_success_outdated_parameters(mock_cursor):
+    """Test that a hash made with outdated Argon2 parameters is upgraded on login."""
+
+    mock_cursor.fetchone.return_value = {"password": PasswordHasher(time_cost=1).hash("password123")}
+
+    result = login(username="testuser", password="password123")
+    assert result is True, "Expected login to succeed, but it failed."
+
+    new_hash, _, _ = mock_cursor.execute.call_args_list[1][0][1]
+    assert not password_needs_rehash(new_hash), "Expected the hash to use current parameters."
+
 def test_login_invalid_password(mock_cursor):
     """Test login with an invalid password."""
 
-    mock_cursor.fetchone.return_value = {"password": hashlib.sha256("wrongpassword".encode()).hexdigest()}
+    mock_cursor.fetchone.return_value = {"password": HASHES["wrongpassword"]}
 
     result = login(username="testuser", password="password123")
     assert result is False, "Expected login to fail, but it succeeded."
 
+def test_login_invalid_password_legacy_sha256(mock_cursor):
+    """Test login with an invalid password against a legacy SHA-256 hash."""
+
+    mock_cursor.fetchone.return_value = {"password": LEGACY_WRONGPASSWORD_HASH}
+
+    result = login(username="testuser", password="password123")
+    assert result is False, "Expected login to fail, but it succeeded."
+
+def test_login_uses_cached_password(mock_cursor):
+    """Test that repeat logins reuse the cached password hash instead of querying."""
+
+    mock_cursor.fetchone.return_value = {"password": HASHES["password123"]}
+
+    assert login(username="testuser", password="password123") is True
+    assert login(username="testuser", password="wrongpassword") is False
+    assert login(username="testuser", password="password123") is True
+    assert mock_cursor.execute.call_count == 1, "Expected a single SELECT for repeat logins."
+
+def test_login_cached_password_expires(mock_cursor, mocker):
+    """Test that an expired cached hash is looked up again."""
+
+    mock_cursor.fetchone.return_value = {"password": HASHES["password123"]}
+    login(username="testuser", password="password123")
+
+    mocker.patch("models.user_model.time.monotonic", return_value=time.monotonic() + PASSWORD_CACHE_TTL + 1)
+    login(username="testuser", password="password123")
+    assert mock_cursor.execute.call_count == 2, "Expected the expired hash to be queried again."
+
 def test_login_nonexistent_user(mock_cursor):
     """Test login with a non-existent username."""
 
@@ -101,6 +295,15 @@ def test_login_nonexistent_user(mock_cursor):
     result = login(username="nonexistentuser", password="password123")
     assert result is False, "Expected login to fail, but it succeeded."
 
+def test_login_nonexistent_user_still_verifies(mock_cursor, mocker):
+    """Test that an unknown username still pays for an Argon2 check, hiding it from timing."""
+
+    mock_cursor.fetchone.return_value = None
+    mock_ph = mocker.patch("models.user_model._ph", wraps=models.user_model._ph)
+
+    assert login(username="nonexistentuser", password="password123") is False
+    mock_ph.verify.assert_called_once_with(models.user_model._DUMMY_HASH, "password123")
+
 ######################################################
 #
 #    Update Password
@@ -110,35 +313,123 @@ def test_login_nonexistent_user(mock_cursor):
 def test_update_password_success(mock_cursor):
     """Test successful password update."""
 
-    mock_cursor.fetchone.return_value = {"password": hashlib.sha256("oldpassword".encode()).hexdigest()}
+    mock_cursor.fetchone.return_value = {"password": HASHES["oldpassword"]}
 
     update_password(username="testuser", old_password="oldpassword", new_password="newpassword123")
 
     expected_query = normalize_whitespace("""
-        UPDATE users SET password = ? WHERE username = ?
+        UPDATE users SET password = ? WHERE username = ? AND password = ?
     """)
 
     actual_query = normalize_whitespace(mock_cursor.execute.call_args_list[1][0][0])
 
     assert actual_query == expected_query, "The SQL query did not match the expected structure."
 
-    actual_arguments = mock_cursor.execute.call_args_list[1][0][1]
+    actual_hash, actual_username, actual_old_hash = mock_cursor.execute.call_args_list[1][0][1]
+
+    assert actual_username == "testuser", f"Expected username 'testuser', got {actual_username}."
+    assert actual_old_hash == mock_cursor.fetchone.return_value["password"], "Expected the update to match the verified hash."
+    assert ph.verify(actual_hash, "newpassword123"), "The stored hash does not match the new password."
+
+def test_update_password_invalidates_cached_password(mock_cursor):
+    """Test that changing the password drops the cached hash."""
+
+    mock_cursor.fetchone.return_value = {"password": HASHES["oldpassword"]}
+    assert login(username="testuser", password="oldpassword") is True
+
+    update_password(username="testuser", old_password="oldpassword", new_password="newpassword123")
+
+    new_hash = mock_cursor.execute.call_args_list[-1][0][1][0]
+    mock_cursor.fetchone.return_value = {"password": new_hash}
+    assert login(username="testuser", password="oldpassword") is False
+    assert login(username="testuser", password="newpassword123") is True
+
+def test_update_password_concurrent_change(mock_cursor):
+    """Test that the update is rejected if the password changed after it was verified."""
 
-    expected_arguments = (hashlib.sha256("newpassword123".encode()).hexdigest(), "testuser")
-    assert actual_arguments == expected_arguments, f"The SQL query arguments did not match. Expected {expected_arguments}, got {actual_arguments}."
+    mock_cursor.fetchone.return_value = {"password": HASHES["oldpassword"]}
+    mock_cursor.rowcount = 0
+
+    with pytest.raises(ValueError, match="Invalid username or old password"):
+        update_password(username="testuser", old_password="oldpassword", new_password="newpassword123")
 
 def test_update_password_invalid_old_password(mock_cursor):
     """Test password update with an invalid old password."""
 
-    mock_cursor.fetchone.return_value = {"password": hashlib.sha256("wrongoldpassword".encode()).hexdigest()}
+    mock_cursor.fetchone.return_value = {"password": HASHES["wrongoldpassword"]}
 
     with pytest.raises(ValueError, match="Invalid username or old password"):
         update_password(username="testuser", old_password="oldpassword", new_password="newpassword123")
 
+def test_update_password_invalid_old_password_skips_hashing(mock_cursor, mocker):
+    """Test that the new password is not hashed when the old password is wrong."""
+
+    mock_cursor.fetchone.return_value = {"password": HASHES["wrongoldpassword"]}
+    mock_hash = mocker.patch("models.user_model.hash_password")
+
+    with pytest.raises(ValueError, match="Invalid username or old password"):
+        update_password(username="testuser", old_password="oldpassword", new_password="newpassword123")
+    mock_hash.assert_not_called()
+
 def test_update_password_nonexistent_user(mock_cursor):
     """Test password update with a non-existent username."""
 
     mock_cursor.fetchone.return_value = None
 
     with pytest.raises(ValueError, match="Invalid username or old password"):
-        update_password(username="nonexistentuser", old_password="oldpassword", new_password="newpassword123")
\ No newline at end of file
+        update_password(username="nonexistentuser", old_password="oldpassword", new_password="newpassword123")
+
+def test_update_password_nonexistent_user_still_verifies(mock_cursor, mocker):
+    """Test that an unknown username still pays for an Argon2 check, hiding it from timing."""
+
+    mock_cursor.fetchone.return_value = None
+    mock_ph = mocker.patch("models.user_model._ph", wraps=models.user_model._ph)
+
+    with pytest.raises(ValueError, match="Invalid username or old password"):
+        update_password(username="nonexistentuser", old_password="oldpassword", new_password="newpassword123")
+    mock_ph.verify.assert_called_once_with(models.user_model._DUMMY_HASH, "oldpassword")
+
+######################################################
+#
+#    Verify Password
+#
+######################################################
+
+def test_hash_password_uses_hash_pool(mocker):
+    """Test that hashing runs in the dedicated thread pool under monkey-patched workers."""
+
+    mock_pool = mocker.patch("models.user_model._hash_pool")
+    mock_pool.apply.side_effect = lambda func, args: func(*args)
+
+    stored_hash = hash_password("password123")
+
+    assert verify_password(stored_hash, "password123"), "The hash does not match the password."
+    assert mock_pool.apply.call_count == 2
+
+def test_verify_password_argon2():
+    """Test verifying a password against an Argon2id hash."""
+
+    stored_hash = HASHES["password123"]
+
+    assert verify_password(stored_hash, "password123") is True
+    assert verify_password(stored_hash, "wrongpassword") is False
+
+def test_verify_password_legacy_sha256():
+    """Test verifying a password against a legacy SHA-256 hash."""
+
+    stored_hash = LEGACY_PASSWORD123_HASH
+
+    assert verify_password(stored_hash, "password123") is True
+    assert verify_password(stored_hash, "wrongpassword") is False
+
+def test_verify_password_corrupt_hash():
+    """Test that a malformed Argon2 hash is treated as a mismatch."""
+
+    assert verify_password("$argon2id$not-a-real-hash", "password123") is False
+
+def test_password_needs_rehash():
+    """Test detecting stored hashes that should be upgraded."""
+
+    assert password_needs_rehash(HASHES["password123"]) is False
+    assert password_needs_rehash(PasswordHasher(time_cost=1).hash("password123")) is True
+    assert password_needs_rehash(LEGACY_PASSWORD123_HASH) is True
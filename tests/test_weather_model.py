@@ -1,11 +1,30 @@
+import gzip
+import os
 import pytest
-import json
+import threading
+from concurrent.futures import Future
+import time
+import orjson
 import requests
+import subprocess
+import sys
 from unittest.mock import patch, mock_open
+import models.weather_model
 from models.weather_model import (
+    BATCH_MAX_WORKERS,
+    CACHE_TTL,
+    REQUEST_TIMEOUT,
+    clear_weather_cache,
     fetch_weather_data, 
+    fetch_weather_data_conditional,
+    fetch_weather_data_batch,
     write_data_to_json_file,
+    get_cache_filename,
+    normalize_city,
     load_weather_data,
+    compute_day_stats,
+    get_day_stats,
+    prune_cache_files,
     get_current_conditions,
     get_week_average_temp,
     get_max_temp_day,
@@ -13,85 +32,386 @@ from models.weather_model import (
     get_highest_precip_day
 )
 import warnings
+import zlib
 warnings.filterwarnings("ignore", message="urllib3 v2 only supports OpenSSL")
 
 
+@pytest.fixture(autouse=True)
+def clear_cached_weather():
+    """Start every test with an empty in-memory weather cache."""
+    clear_weather_cache()
+    yield
+    clear_weather_cache()
 
 
-# Mocking requests.get for fetch_weather_data
-@patch("models.weather_model.requests.get")
-def test_fetch_weather_data_success(mock_get):
+
+@pytest.fixture
+def session_get(monkeypatch):
+    """Patch the shared session's `get` so no request reaches the weather API."""
+    monkeypatch.setenv("WEATHER_API_KEY", "test-key")
+    models.weather_model._url_for.cache_clear()
+    with patch.object(models.weather_model._session, "get") as mock_get:
+        yield mock_get
+    models.weather_model._url_for.cache_clear()
+
+def test_fetch_weather_data_success(session_get):
     """Test successful fetching of weather data."""
-    mock_get.return_value.status_code = 200
-    mock_get.return_value.json.return_value = {"city": "TestCity", "currentConditions": {"temp": 70}}
+    session_get.return_value.status_code = 200
+    session_get.return_value.content = b'{"city": "TestCity", "currentConditions": {"temp": 70}}'
 
     result = fetch_weather_data("TestCity")
     assert result == {"city": "TestCity", "currentConditions": {"temp": 70}}
+    assert session_get.call_args.kwargs["timeout"] == REQUEST_TIMEOUT
+
+def test_fetch_weather_data_url_encodes_city(session_get):
+    """Test that the city is URL-encoded into the request path."""
+    session_get.return_value.content = b'{}'
+
+    fetch_weather_data("San Francisco/CA")
+    url = session_get.call_args.args[0]
+    assert "/timeline/san%20francisco%2Fca/next7days?" in url
+    assert "&key=test-key&" in url
+
+def test_fetch_weather_data_missing_api_key(session_get, monkeypatch):
+    """Test that a missing API key is reported instead of sending a keyless request."""
+    monkeypatch.delenv("WEATHER_API_KEY")
+
+    with pytest.raises(ValueError, match="WEATHER_API_KEY is not set"):
+        fetch_weather_data("TestCity")
+    session_get.assert_not_called()
 
-@patch("models.weather_model.requests.get")
-def test_fetch_weather_data_http_error(mock_get):
+def test_fetch_weather_data_http_error(session_get):
     """Test fetching weather data with an HTTP error."""
-    mock_get.return_value.raise_for_status.side_effect = requests.exceptions.HTTPError("404 Client Error")
+    session_get.return_value.raise_for_status.side_effect = requests.exceptions.HTTPError("404 Client Error")
 
     with pytest.raises(ValueError, match="HTTP error occurred:"):
         fetch_weather_data("InvalidCity")
 
-@patch("models.weather_model.requests.get")
-def test_fetch_weather_data_generic_error(mock_get):
+def test_fetch_weather_data_generic_error(session_get):
     """Test fetching weather data with a generic error."""
-    mock_get.side_effect = Exception("Network issue")
+    session_get.side_effect = Exception("Network issue")
 
     with pytest.raises(ValueError, match="An error occurred:"):
         fetch_weather_data("TestCity")
 
+def test_session_retries_server_errors():
+    """Test that the shared session retries 5xx responses from the API."""
+    retry = models.weather_model._session.get_adapter("https://weather.visualcrossing.com").max_retries
+    assert retry.total == 3
+    assert {500, 502, 503, 504} <= set(retry.status_forcelist)
+    assert retry.is_retry("GET", 503)
+
+@patch("models.weather_model._load_from_file_or_api")
+def test_fetch_weather_data_batch(mock_load):
+    """Test that a batch load overlaps the loads and fills the in-memory cache."""
+    # Every load waits until BATCH_MAX_WORKERS of them are in progress at once
+    barrier = threading.Barrier(BATCH_MAX_WORKERS, timeout=5)
+    def overlapping_load(city):
+        barrier.wait()
+        return {"city": city}
+    mock_load.side_effect = overlapping_load
+    cities = [f"City{i}" for i in range(BATCH_MAX_WORKERS)]
+
+    result = fetch_weather_data_batch(cities)
+    assert result == {city: {"city": city.lower()} for city in cities}
+    assert mock_load.call_count == BATCH_MAX_WORKERS
+
+    # A second batch is served from the cache
+    assert fetch_weather_data_batch(cities) == result
+    assert mock_load.call_count == BATCH_MAX_WORKERS
+
 # Mocking file handling for write_data_to_json_file
+@patch("os.replace")
 @patch("builtins.open", new_callable=mock_open)
-def test_write_data_to_json_file(mock_file):
+def test_write_data_to_json_file(mock_file, mock_replace):
     """Test writing weather data to a JSON file."""
     data = {"city": "TestCity", "currentConditions": {"temp": 70}}
     write_data_to_json_file(data, "weather_data.json")
 
-    # Ensure the file was opened in write mode
-    mock_file.assert_called_once_with("weather_data.json", "w")
+    # Ensure a temporary file was opened in binary write mode
+    tmp_filename = mock_file.call_args.args[0]
+    assert tmp_filename.startswith("weather_data.json.") and tmp_filename.endswith(".tmp")
+    mock_file.assert_called_once_with(tmp_filename, "wb")
 
     # Check that the content written matches the serialized JSON
-    written_content = "".join(call.args[0] for call in mock_file().write.call_args_list)
-    assert written_content == json.dumps(data, indent=4)
+    written_content = b"".join(call.args[0] for call in mock_file().write.call_args_list)
+    assert gzip.decompress(written_content) == orjson.dumps(data)
 
+    # Ensure the temporary file atomically replaced the target
+    mock_replace.assert_called_once_with(tmp_filename, "weather_data.json")
 
-# Mocking file reading and existence for load_weather_data
-@patch("models.weather_model.fetch_weather_data", return_value={"city": "TestCity", "currentConditions": {"temp": 70}})
+@patch("os.replace")
+@patch("builtins.open", new_callable=mock_open)
+def test_write_data_to_json_file_pretty(mock_file, mock_replace):
+    """Test that pretty output is indented only when asked for."""
+    data = {"city": "TestCity", "currentConditions": {"temp": 70}}
+    write_data_to_json_file(data, "weather_data.json", pretty=True)
+
+    written_content = b"".join(call.args[0] for call in mock_file().write.call_args_list)
+    assert gzip.decompress(written_content) == orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+@patch("os.replace", side_effect=OSError("disk full"))
+@patch("os.remove")
 @patch("os.path.exists", return_value=True)
-@patch("os.path.getsize", return_value=100)  # Ensure the file has content
-@patch("builtins.open", new_callable=mock_open, read_data='{"city": "TestCity", "currentConditions": {"temp": 70}}')
-def test_load_weather_data_from_file(mock_file, mock_size, mock_exists, mock_fetch):
+@patch("builtins.open", new_callable=mock_open)
+def test_write_data_to_json_file_cleans_up(mock_file, mock_exists, mock_remove, mock_replace):
+    """Test that the temporary file is removed if the write fails."""
+    with pytest.raises(OSError, match="disk full"):
+        write_data_to_json_file({"city": "TestCity"}, "weather_data.json")
+    mock_remove.assert_called_once_with(mock_file.call_args.args[0])
+
+
+def test_write_data_to_json_file_unserializable(tmp_path):
+    """Test that data orjson cannot encode leaves no temporary file behind."""
+    with pytest.raises(TypeError):
+        write_data_to_json_file({"city": object()}, str(tmp_path / "weather_data.json"))
+    assert list(tmp_path.iterdir()) == []
+
+def test_normalize_city():
+    """Test that city names differing only in case or whitespace normalize the same."""
+    assert normalize_city("  Boston ") == "boston"
+    assert normalize_city("BOSTON") == normalize_city("boston")
+
+def test_get_cache_filename():
+    """Test that each city gets its own cache file."""
+    assert get_cache_filename("TestCity") == "weather_data_TestCity.json.gz"
+    assert get_cache_filename("TestCity") != get_cache_filename("OtherCity")
+
+
+def cache_file_stat(size, mtime):
+    """Build an `os.stat` result for a cache file of the given size and mtime."""
+    return os.stat_result((0o100644, 0, 0, 1, 0, 0, size, mtime, mtime, mtime))
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Keep cache files written by a test in its own temporary directory."""
+    monkeypatch.setattr(models.weather_model, "CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+@patch("models.weather_model.fetch_weather_data_conditional")
+def test_load_weather_data_from_file(mock_fetch, cache_dir):
     """Test loading weather data from an existing JSON file."""
+    (cache_dir / "weather_data_testcity.json.gz").write_bytes(
+        gzip.compress(b'{"city": "TestCity", "currentConditions": {"temp": 70}}')
+    )
     result = load_weather_data("TestCity")
     assert result == {"city": "TestCity", "currentConditions": {"temp": 70}}
-    mock_fetch.assert_not_called()  # Ensure fetch_weather_data was not called
+    mock_fetch.assert_not_called()  # Ensure the API was not called
+
+@patch("models.weather_model.fetch_weather_data_conditional", return_value=({"city": "testcity"}, {}))
+def test_load_weather_data_corrupt_gzip_file(mock_fetch, cache_dir):
+    """Test that a cache file with a damaged deflate stream falls back to the API."""
+    compressed = bytearray(gzip.compress(b'{"city": "TestCity", "currentConditions": {"temp": 70}}' * 20))
+    compressed[10] ^= 0xFF  # Damage the first deflate block header, right after the gzip header
+    with pytest.raises(zlib.error):
+        gzip.decompress(bytes(compressed))
+    (cache_dir / "weather_data_testcity.json.gz").write_bytes(bytes(compressed))
+
+    assert load_weather_data("TestCity") == {"city": "testcity"}
+    mock_fetch.assert_called_once_with("testcity", {})
+
+def test_cache_dir_is_created(tmp_path):
+    """Test that a configured WEATHER_CACHE_DIR is created at import."""
+    cache_dir = tmp_path / "missing" / "cache"
+    subprocess.run(
+        [sys.executable, "-c", "import models.weather_model"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env={**os.environ, "WEATHER_CACHE_DIR": str(cache_dir)},
+        check=True
+    )
+    assert cache_dir.is_dir()
+
+def test_get_cache_filename_in_cache_dir(cache_dir):
+    """Test that cache files are placed in CACHE_DIR."""
+    assert get_cache_filename("TestCity") == str(cache_dir / "weather_data_TestCity.json.gz")
 
+# Mocking file reading and existence for load_weather_data
 
+@patch("models.weather_model.fetch_weather_data_conditional", return_value=({"city": "TestCity", "currentConditions": {"temp": 70}}, {}))
+@patch("models.weather_model.write_data_to_json_file")
+@patch("os.stat", side_effect=lambda _: cache_file_stat(100, time.time() - CACHE_TTL - 1))
+@patch("builtins.open", new_callable=mock_open, read_data=b"")
+def test_load_weather_data_stale_file(mock_file, mock_stat, mock_write, mock_fetch):
+    """Test that a cache file older than the TTL is refreshed from the API."""
+    result = load_weather_data("TestCity")
+    assert result == {"city": "TestCity", "currentConditions": {"temp": 70}}
+    mock_fetch.assert_called_once_with("testcity", {})
+    mock_write.assert_called_once_with(result, "weather_data_testcity.json.gz")
 
-@patch("os.path.exists", return_value=False)
-@patch("models.weather_model.fetch_weather_data", return_value={"city": "TestCity", "currentConditions": {"temp": 70}})
+@patch("os.stat", side_effect=FileNotFoundError)
+@patch("models.weather_model.fetch_weather_data_conditional", return_value=({"city": "TestCity", "currentConditions": {"temp": 70}}, {}))
 @patch("models.weather_model.write_data_to_json_file")
-def test_load_weather_data_fallback_to_api(mock_write, mock_fetch, mock_exists):
+def test_load_weather_data_fallback_to_api(mock_write, mock_fetch, mock_stat):
     """Test loading weather data by falling back to the API."""
     result = load_weather_data("TestCity")
     assert result == {"city": "TestCity", "currentConditions": {"temp": 70}}
-    mock_fetch.assert_called_once_with("TestCity")
+    mock_fetch.assert_called_once_with("testcity", {})
     mock_write.assert_called_once()
 
-@patch("models.weather_model.fetch_weather_data", return_value={"city": "TestCity", "currentConditions": {"temp": 70}})
-@patch("os.path.exists", return_value=True)
-@patch("builtins.open", new_callable=mock_open, read_data="Invalid JSON")
-def test_load_weather_data_invalid_file(mock_file, mock_exists, mock_fetch):
+def test_fetch_weather_data_conditional_not_modified(session_get):
+    """Test that a 304 response sends the validators and returns no data without parsing a body."""
+    session_get.return_value.status_code = 304
+
+    with patch("orjson.loads") as mock_loads:
+        data, validators = fetch_weather_data_conditional("TestCity", {"ETag": '"abc"', "Last-Modified": "Mon"})
+    mock_loads.assert_not_called()
+    assert data is None
+    assert validators == {"ETag": '"abc"', "Last-Modified": "Mon"}
+    assert session_get.call_args.kwargs["headers"] == {"If-None-Match": '"abc"', "If-Modified-Since": "Mon"}
+
+def test_load_weather_data_saves_validators(session_get, cache_dir):
+    """Test that the API's ETag is saved next to the cache file."""
+    session_get.return_value.status_code = 200
+    session_get.return_value.headers = {"ETag": '"abc"'}
+    session_get.return_value.content = b'{"city": "testcity"}'
+
+    assert load_weather_data("TestCity") == {"city": "testcity"}
+    validators_file = cache_dir / "weather_data_testcity.validators.json.gz"
+    assert orjson.loads(gzip.decompress(validators_file.read_bytes())) == {"ETag": '"abc"'}
+
+def test_load_weather_data_stale_file_not_modified(session_get, cache_dir):
+    """Test that a stale cache file the API reports unchanged is reused and marked fresh."""
+    cache_file = cache_dir / "weather_data_testcity.json.gz"
+    cache_file.write_bytes(gzip.compress(b'{"city": "testcity"}'))
+    (cache_dir / "weather_data_testcity.validators.json.gz").write_bytes(gzip.compress(b'{"ETag": "\\"abc\\""}'))
+    stale = time.time() - CACHE_TTL - 1
+    os.utime(cache_file, (stale, stale))
+    session_get.return_value.status_code = 304
+
+    assert load_weather_data("TestCity") == {"city": "testcity"}
+    assert session_get.call_args.kwargs["headers"] == {"If-None-Match": '"abc"'}
+    assert os.path.getmtime(cache_file) > stale
+
+@patch("models.weather_model.fetch_weather_data_conditional", return_value=({"city": "TestCity", "currentConditions": {"temp": 70}}, {}))
+@patch("models.weather_model.write_data_to_json_file")
+@patch("os.stat", side_effect=lambda _: cache_file_stat(100, time.time()))
+@patch("builtins.open", new_callable=mock_open, read_data=b"Invalid JSON")
+def test_load_weather_data_invalid_file(mock_file, mock_stat, mock_write, mock_fetch):
     """Test handling of invalid JSON data in the file."""
-    with patch("json.load", side_effect=json.JSONDecodeError("Invalid JSON", "", 0)):
+    with patch("orjson.loads", side_effect=orjson.JSONDecodeError("Invalid JSON", "", 0)):
         result = load_weather_data("TestCity")
         assert result == {"city": "TestCity", "currentConditions": {"temp": 70}}  # Should fallback to fetch_weather_data
     mock_fetch.assert_called_once()
 
+@patch("os.stat", side_effect=FileNotFoundError)
+@patch("models.weather_model.fetch_weather_data_conditional", side_effect=lambda city, validators: ({"city": city}, {}))
+@patch("models.weather_model.write_data_to_json_file")
+def test_load_weather_data_memory_cache(mock_write, mock_fetch, mock_stat):
+    """Test that repeat loads are served from memory and cities do not share data."""
+    assert load_weather_data("TestCity") == {"city": "testcity"}
+    assert load_weather_data(" testcity ") == {"city": "testcity"}
+    assert load_weather_data("OtherCity") == {"city": "othercity"}
+    assert mock_fetch.call_count == 2
+
+@patch("os.stat", side_effect=FileNotFoundError)
+@patch("models.weather_model.fetch_weather_data_conditional", side_effect=lambda city, validators: ({"city": city}, {}))
+@patch("models.weather_model.write_data_to_json_file")
+def test_load_weather_data_memory_cache_expired(mock_write, mock_fetch, mock_stat):
+    """Test that expired in-memory entries are reloaded."""
+    load_weather_data("TestCity")
+    models.weather_model._weather_cache["testcity"] = (time.monotonic() - 1, {"city": "testcity"})
+    load_weather_data("TestCity")
+    assert mock_fetch.call_count == 2
+
+
+
+@patch("models.weather_model.MEMORY_CACHE_SIZE", 2)
+@patch("models.weather_model._load_from_file_or_api", side_effect=lambda city: {"city": city, "days": [{"temp": 70}]})
+def test_memory_cache_evicts_least_recently_used(mock_load):
+    """Test that the in-memory caches keep at most MEMORY_CACHE_SIZE cities."""
+    for city in ("a", "b", "a", "c"):
+        get_day_stats(city)
+    assert list(models.weather_model._weather_cache) == ["a", "c"]
+    assert list(models.weather_model._stats_cache) == ["a", "c"]
+
+def test_prune_cache_files(cache_dir):
+    """Test that only cache files unused for longer than the max age are deleted."""
+    old_file = cache_dir / "weather_data_old.json.gz"
+    old_validators = cache_dir / "weather_data_old.validators.json.gz"
+    new_file = cache_dir / "weather_data_new.json.gz"
+    other_file = cache_dir / "notes.json.gz"
+    for path in (old_file, old_validators, new_file, other_file):
+        path.write_bytes(b"")
+    old = time.time() - 120
+    for path in (old_file, old_validators, other_file):
+        os.utime(path, (old, old))
+
+    prune_cache_files(max_age=60)
+    assert sorted(path.name for path in cache_dir.iterdir()) == ["notes.json.gz", "weather_data_new.json.gz"]
+
+@patch("models.weather_model._load_from_file_or_api")
+def test_load_weather_data_single_flight(mock_load):
+    """Test that concurrent cache misses for a city share one load."""
+    release = threading.Event()
+    def slow_load(city):
+        release.wait(timeout=5)
+        return {"city": city}
+    mock_load.side_effect = slow_load
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(load_weather_data("TestCity"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while len(models.weather_model._inflight) == 0:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == [{"city": "testcity"}] * 5
+    mock_load.assert_called_once_with("testcity")
+    assert models.weather_model._inflight == {}
+
+@patch("models.weather_model._load_from_file_or_api")
+def test_load_weather_data_single_flight_base_exception(mock_load):
+    """Test that waiting callers are released when the load dies with a BaseException."""
+    class Interrupted(BaseException):
+        pass
+
+    release = threading.Event()
+    def interrupted_load(city):
+        release.wait(timeout=5)
+        raise Interrupted()
+    mock_load.side_effect = interrupted_load
+
+    waiting = threading.Event()
+    class WatchedFuture(Future):
+        def result(self, timeout=None):
+            waiting.set()
+            return super().result(timeout)
+
+    errors = []
+    def follower():
+        try:
+            load_weather_data("TestCity")
+        except Interrupted as err:
+            errors.append(err)
+
+    with patch("models.weather_model.Future", WatchedFuture):
+        leader = threading.Thread(target=lambda: pytest.raises(Interrupted, load_weather_data, "TestCity"), daemon=True)
+        leader.start()
+        while len(models.weather_model._inflight) == 0:
+            time.sleep(0.001)
+        waiter = threading.Thread(target=follower, daemon=True)
+        waiter.start()
+        assert waiting.wait(timeout=5), "Expected the second caller to wait on the first load."
+        release.set()
+        leader.join(timeout=5)
+        waiter.join(timeout=5)
+
+    assert not waiter.is_alive(), "Expected the waiting caller to be released."
+    assert len(errors) == 1
+    mock_load.assert_called_once_with("testcity")
+    assert models.weather_model._inflight == {}
+
+@patch("models.weather_model._load_from_file_or_api", side_effect=ValueError("HTTP error occurred: 500"))
+def test_load_weather_data_single_flight_error(mock_load):
+    """Test that a failed load is raised and not cached."""
+    with pytest.raises(ValueError, match="HTTP error occurred"):
+        load_weather_data("TestCity")
+    assert models.weather_model._weather_cache == {}
+    assert models.weather_model._inflight == {}
+
 
 
 @patch("models.weather_model.load_weather_data", return_value={"currentConditions": {"temp": 70, "humidity": 50}})
@@ -162,4 +482,39 @@ def test_get_highest_precip_day(mock_load):
 def test_get_highest_precip_day_no_days(mock_load):
     """Test determining the day with the highest precipitation probability when no days data is available."""
     with pytest.raises(ValueError, match="No day data available"):
-        get_highest_precip_day("TestCity")
\ No newline at end of file
+        get_highest_precip_day("TestCity")
+
+def test_compute_day_stats():
+    """Test computing all day statistics in a single pass."""
+    stats = compute_day_stats(mock_weather_data["days"])
+    assert stats == {
+        "week_average_temp": (70 + 68 + 73) / 3,
+        "max_temp_day": mock_weather_data["days"][2],
+        "min_temp_day": mock_weather_data["days"][1],
+        "highest_precip_day": mock_weather_data["days"][2],
+    }
+
+def test_compute_day_stats_ties_pick_first_day():
+    """Test that ties resolve to the earliest day, matching max()/min()."""
+    days = [
+        {"temp": 70, "tempmax": 80, "tempmin": 60, "precipprob": 50},
+        {"temp": 70, "tempmax": 80, "tempmin": 60, "precipprob": 50},
+    ]
+    stats = compute_day_stats(days)
+    assert stats["max_temp_day"] is days[0]
+    assert stats["min_temp_day"] is days[0]
+    assert stats["highest_precip_day"] is days[0]
+
+@patch("models.weather_model.compute_day_stats", wraps=compute_day_stats)
+@patch("models.weather_model.load_weather_data", return_value=mock_weather_data)
+def test_get_day_stats_reused(mock_load, mock_compute):
+    """Test that day statistics are computed once per loaded weather document."""
+    get_week_average_temp("TestCity")
+    get_max_temp_day("TestCity")
+    get_min_temp_day("TestCity")
+    get_highest_precip_day("TestCity")
+    assert mock_compute.call_count == 1
+
+    mock_load.return_value = {"days": [{"temp": 50, "tempmax": 55, "tempmin": 45, "precipprob": 0}]}
+    assert get_day_stats("TestCity")["week_average_temp"] == 50
+    assert mock_compute.call_count == 2